@@ -1,27 +1,28 @@
 # config_setup.py
 import yaml
 import os
-import glob
 import logging
-from pathlib import Path
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 # Load configuration
 with open("config/snakemake_config.yaml") as f:
-    config = yaml.safe_load(f)
+    config = yaml.load(f, Loader=SafeLoader)
 
 # Function to get sample names from fastq files
 def get_samples():
-    fastq_files = glob.glob(os.path.join(config["directories"]["raw_data"], "*.fq.gz"))
-    sample_names = [os.path.basename(f).replace(".fq.gz", "") for f in fastq_files]
+    # scandir's cached d_type answers is_file without a stat per entry
+    with os.scandir(config["directories"]["raw_data"]) as it:
+        sample_names = sorted(e.name[:-6] for e in it if e.name.endswith(".fq.gz") and e.is_file(follow_symlinks=False))
     if not sample_names:
         logging.warning("No sample files found in the specified directory.")
     logging.info(f"Detected samples: {sample_names}")
     return sample_names
 
 # Create required directories
-for dir_name in config["directories"].values():
-    Path(dir_name).mkdir(parents=True, exist_ok=True)
-
 required_dirs = [
     os.path.join(config["directories"]["results"], "qc"),
     os.path.join(config["directories"]["results"], "aligned"),
@@ -33,10 +34,25 @@ required_dirs = [
     os.path.join(config["directories"]["logs"], "featurecounts")
 ]
 
-for dir_path in required_dirs:
-    Path(dir_path).mkdir(parents=True, exist_ok=True)
+# Create each required directory once, skipping those that already exist
+for dir_path in set(required_dirs) | set(config["directories"].values()):
+    if not os.path.isdir(dir_path):
+        os.makedirs(dir_path, exist_ok=True)
+
+def write_samples(samples, path="config/samples.txt"):
+    """Write the sample list only if it changed, so Snakemake sees a stable mtime."""
+    new = "\n".join(sorted(samples))
+    try:
+        with open(path) as f:
+            if f.read() == new:
+                return
+    except FileNotFoundError:
+        pass
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(new)
+    os.replace(tmp_path, path)
 
 # Save detected samples to a file so Snakemake can use it
 samples = get_samples()
-with open("config/samples.txt", "w") as f:
-    f.write("\n".join(samples))
+write_samples(samples)
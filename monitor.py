@@ -1,86 +1,168 @@
+import math
 import time
 import os
 import subprocess
 import logging
+import threading
 from pathlib import Path
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+from watchdog.events import PatternMatchingEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
 import update_sample  # Ensure the correct import
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
 WATCH_DIR = "tests/data/raw_fastq"
-CHECK_INTERVAL = 5  # Check every 5 seconds
+DEBOUNCE_S = 15  # Wait for this many quiet seconds before launching Snakemake
+
+# inotify/FSEvents do not see changes made by other hosts on NFS/SMB mounts.
+# Set BULKRNASEQ_POLLING=1 to fall back to watchdog's PollingObserver there.
+USE_POLLING = os.environ.get("BULKRNASEQ_POLLING") == "1"
 
 # Ensure directory exists
 Path(WATCH_DIR).mkdir(parents=True, exist_ok=True)
 
-# Store seen files
-seen_files = set(os.listdir(WATCH_DIR))
+LOCK_FILE = ".snakemake.lock"
+SNAKEMAKE_LOG = "logs/snakemake.log"
+SAMPLE_LIST_FILE = "config/samples.txt"
+SNAKEMAKE_CMD = ["snakemake", "--use-conda", "-j", "8", "--rerun-incomplete"]
+BATCH_SIZE = 200  # Above this many samples, split the `all` rule into --batch runs
+Path(SNAKEMAKE_LOG).parent.mkdir(parents=True, exist_ok=True)
 
-logging.info(f"Monitoring {WATCH_DIR} for new files...")
+def acquire_lock():
+    """Take an exclusive, non-blocking lock on LOCK_FILE.
 
-LOCK_FILE = ".snakemake_lock"
+    Returns the open lock file, or None if another run holds it. The OS drops
+    the lock when the file is closed or the process dies, so no stale lock is left behind.
+    """
+    lock_fd = open(LOCK_FILE, "w")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_fd.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_fd.close()
+        return None
+    return lock_fd
+
+def snakemake_commands():
+    """Return the Snakemake invocations needed for the current sample list."""
+    try:
+        with open(SAMPLE_LIST_FILE) as f:
+            n_samples = sum(1 for line in f if line.strip())
+    except FileNotFoundError:
+        n_samples = 0
 
-def is_snakemake_running():
-    return os.path.exists(LOCK_FILE)
+    if n_samples <= BATCH_SIZE:
+        return [SNAKEMAKE_CMD]
+    # Each batch only builds the DAG for its share of the `all` rule inputs
+    n_batches = math.ceil(n_samples / BATCH_SIZE)
+    return [SNAKEMAKE_CMD + ["--batch", f"all={i}/{n_batches}"] for i in range(1, n_batches + 1)]
 
 def run_snakemake():
-    if is_snakemake_running():
-        logging.info("Snakemake is already running. Exiting.")
-        return
+    """Refresh the sample list and run Snakemake under LOCK_FILE.
 
-    # Create a lock file
-    with open(LOCK_FILE, 'w') as f:
-        f.write("Locked")
+    Returns False, without touching the sample list, if another run holds the lock.
+    """
+    lock_fd = acquire_lock()
+    if lock_fd is None:
+        logging.info("Snakemake is already running.")
+        return False
 
     try:
-        logging.info("Starting Snakemake...")
-        result = subprocess.run(
-            ["snakemake", "--use-conda", "-j", "8", "--rerun-incomplete"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
+        logging.info("Updating sample list...")
+        update_sample.update_sample_list()
+
+        logging.info(f"Starting Snakemake (log: {SNAKEMAKE_LOG})...")
+        # Stream Snakemake's output straight to a log file instead of buffering it in memory
+        with open(SNAKEMAKE_LOG, "ab") as log:
+            for cmd in snakemake_commands():
+                logging.info("Running: " + " ".join(cmd))
+                subprocess.run(cmd, check=True, stdout=log, stderr=subprocess.STDOUT)
         logging.info("Snakemake completed successfully.")
-        logging.debug(result.stdout)
-        logging.error(result.stderr)
     except subprocess.CalledProcessError as e:
         logging.error(f"Error triggering Snakemake: {e}")
-        logging.error(f"Snakemake output: {e.output}")
-        logging.error(f"Snakemake stderr: {e.stderr}")
+        logging.error(f"See {SNAKEMAKE_LOG} for Snakemake output.")
     finally:
-        # Remove the lock file after Snakemake finishes
-        if os.path.exists(LOCK_FILE):
-            os.remove(LOCK_FILE)
-        else:
-            logging.warning("Lock file not found, it may have been removed manually.")
+        # Closing the file releases the lock
+        lock_fd.close()
+    return True
+
+class FastqHandler(PatternMatchingEventHandler):
+    """Collect new FASTQ files and launch Snakemake once per batch."""
+
+    def __init__(self):
+        # Only .fq.gz files reach on_created; FastQC HTMLs, BAMs etc. are dropped by watchdog
+        super().__init__(patterns=["*.fq.gz"], ignore_directories=True)
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def on_created(self, event):
+        logging.info(f"New file detected: {event.src_path}")
+        self.queue(event.src_path)
+
+    def on_moved(self, event):
+        # Files renamed into WATCH_DIR (mv, rsync, atomic uploads) only produce a moved event.
+        # Watchdog dispatches a move if either side matches, so check the destination here.
+        if Path(event.dest_path).match("*.fq.gz"):
+            logging.info(f"New file moved in: {event.dest_path}")
+            self.queue(event.dest_path)
+
+    def on_modified(self, event):
+        # A slow cp/scp keeps writing after on_created; each write restarts the quiet period
+        # so the batch is only processed once the file has stopped growing
+        self.queue(event.src_path)
+
+    def queue(self, path):
+        with self.lock:
+            self.pending.add(path)
+            self._schedule()
+
+    def _schedule(self):
+        # Restart the quiet-period timer; callers hold self.lock
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = threading.Timer(DEBOUNCE_S, self.fire)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def fire(self):
+        with self.lock:
+            batch, self.pending = self.pending, set()
+            # A file queued while this timer was firing may already have armed a new one
+            if self.timer is threading.current_thread():
+                self.timer = None
+        if not batch:
+            return
+        logging.info(f"Processing batch of {len(batch)} new file(s)")
+
+        # Run Snakemake. If an earlier batch is still running, keep these files
+        # queued and try again after another quiet period instead of dropping them.
+        if not run_snakemake():
+            with self.lock:
+                self.pending |= batch
+                self._schedule()
+            logging.info(f"Re-queued {len(batch)} file(s) until the current run finishes")
+
+if __name__ == "__main__":
+    observer = PollingObserver() if USE_POLLING else Observer()
+    observer.schedule(FastqHandler(), WATCH_DIR, recursive=False)
+    observer.start()
+    logging.info(f"Monitoring {WATCH_DIR} for new files...")
 
-while True:
     try:
-        logging.info("Checking for new files...")
-        # Get the current set of files
-        current_files = set(os.listdir(WATCH_DIR))
-
-        # Detect new files
-        new_files = current_files - seen_files
-        if new_files:
-            for file in new_files:
-                if file.endswith(".fq.gz"):
-                    file_path = os.path.join(WATCH_DIR, file)
-                    logging.info(f"New file detected: {file_path}")
-
-                    # Update the sample list
-                    logging.info("Updating sample list...")
-                    update_sample.update_sample_list()
-
-                    # Run Snakemake
-                    run_snakemake()
-
-            # Update seen files
-            seen_files = current_files
-
-        time.sleep(CHECK_INTERVAL)  # Wait before checking again
-
+        while True:
+            time.sleep(1)
     except KeyboardInterrupt:
         logging.info("Stopping monitoring...")
-        break
+    finally:
+        observer.stop()
+        observer.join()
@@ -2,6 +2,7 @@ import tomli
 import subprocess
 import tempfile
 import os
+import shutil
 
 def create_conda_env_from_toml():
     # Read the pyproject.toml file
@@ -10,23 +11,30 @@ def create_conda_env_from_toml():
     
     conda_config = config["tool"]["conda-env"]
     
+    # Build environment.yml in memory and write it in one call
+    parts = [
+        f"name: {conda_config['name']}\n",
+        "channels:\n",
+        *[f"  - {channel}\n" for channel in conda_config['channels']],
+        "dependencies:\n",
+        *[f"  - {dep}\n" for dep in conda_config['dependencies']],
+    ]
+    # pip packages live under [tool.conda-env.pip-dependencies] in pyproject.toml
+    pip_dependencies = conda_config.get('pip-dependencies', {}).get('packages', [])
+    if pip_dependencies:
+        # Install pip into the env itself, so the pip: block does not rely on whatever pip conda finds
+        parts.append("  - pip\n")
+        parts.append("  - pip:\n")
+        parts.extend(f"    - {pip_dep}\n" for pip_dep in pip_dependencies)
+
     # Create temporary environment.yml
     with tempfile.NamedTemporaryFile(mode='w', suffix='.yml', delete=False) as tmp:
-        tmp.write(f"name: {conda_config['name']}\n")
-        tmp.write("channels:\n")
-        for channel in conda_config['channels']:
-            tmp.write(f"  - {channel}\n")
-        tmp.write("dependencies:\n")
-        for dep in conda_config['dependencies']:
-            tmp.write(f"  - {dep}\n")
-        if 'pip_dependencies' in conda_config:
-            tmp.write("  - pip:\n")
-            for pip_dep in conda_config['pip_dependencies']:
-                tmp.write(f"    - {pip_dep}\n")
+        tmp.write("".join(parts))
     
-    # Create conda environment
+    # Create conda environment, preferring mamba's libsolv-based solver when it is installed
+    solver = 'mamba' if shutil.which('mamba') else 'conda'
     try:
-        subprocess.run(['conda', 'env', 'create', '-f', tmp.name], check=True)
+        subprocess.run([solver, 'env', 'create', '-f', tmp.name], check=True)
     finally:
         os.unlink(tmp.name)
 
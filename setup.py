@@ -6,4 +6,4 @@ setup(
     packages=find_packages(where="src"),
     package_dir={"": "src"},
     python_requires=">=3.8",
-) 
\ No newline at end of file
+)
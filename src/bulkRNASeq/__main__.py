@@ -1,2 +1,5 @@
+# lets the pipeline be run as `python -m bulkRNASeq`
+from bulkRNASeq.main import main
 
-
+if __name__ == "__main__":
+    main()
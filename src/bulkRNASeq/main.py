@@ -5,25 +5,23 @@
 # Arguments just include type of mode and config file
 
 import argparse
-from src.bulkRNASeq.preprocessing import run_preprocessing
-from src.bulkRNASeq.postprocessing import run_postprocessing
 
 
 def main():
     parser = argparse.ArgumentParser(description="Bulk RNAseq pipeline")
-    parser.add_argument("--mode", required=True, help="Mode to run the pipeline in")
+    parser.add_argument("--mode", required=True, choices=["preprocessing", "postprocessing", "full"],
+                        help="Mode to run the pipeline in")
     parser.add_argument("--config", required=True, help="Path to the config file")
     args = parser.parse_args()
 
-    if args.mode == "preprocessing":
+    # Pipeline modules are imported only after argument parsing, and only for the requested mode,
+    # so --help and bad arguments don't pay for the pandas/rpy2/sklearn imports
+    if args.mode in ("preprocessing", "full"):
+        from bulkRNASeq.preprocessing.run_preprocessing import run_preprocessing
         run_preprocessing(args.config)
-    elif args.mode == "postprocessing":
+    if args.mode in ("postprocessing", "full"):
+        from bulkRNASeq.postprocessing.run_postprocessing import run_postprocessing
         run_postprocessing(args.config)
-    elif args.mode == "full":
-        run_preprocessing(args.config)
-        run_postprocessing(args.config)
-    else:
-        print("Invalid mode")
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,25 @@
 import argparse
+import hashlib
+import io
 import logging
 import os
 import sys
 
 # rpy2 interfaces
-from rpy2.robjects import r, pandas2ri, globalenv
+from rpy2.robjects import r, pandas2ri, numpy2ri, globalenv, StrVector
 import rpy2.robjects as robjects
+from rpy2.robjects.conversion import localconverter
 from rpy2.robjects.packages import importr
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.feather
 
 pandas2ri.activate()
 
+# Annotation columns featureCounts writes between Geneid and the per-sample counts
+FEATURECOUNTS_META_COLS = ['Chr', 'Start', 'End', 'Strand', 'Length']
+
 def setup_logger(prefix, output_dir):
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
@@ -28,7 +37,89 @@ def setup_logger(prefix, output_dir):
     logger.addHandler(sh)
     return logger
 
-def run_deseq2(counts_file, design_file, output_dir):
+def load_counts(counts_file, cache_dir):
+    """
+    Load a counts matrix, reusing a Feather copy in cache_dir while the source file is unchanged.
+
+    The first load parses the TSV and writes <prefix>_counts.<path hash>.feather to cache_dir;
+    later loads memory-map that file instead of re-parsing text. The cache file is named after
+    the source's absolute path and records its size and mtime, so inputs that share a prefix
+    never see each other's data. The cache is best-effort: any read or write error is a miss.
+    """
+    logger = logging.getLogger(__name__)
+    prefix = os.path.basename(counts_file).split('.')[0]
+    source = os.path.abspath(counts_file)
+    path_hash = hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+    feather_path = os.path.join(cache_dir, f"{prefix}_counts.{path_hash}.feather")
+    st = os.stat(counts_file)
+    source_stamp = f"{source}:{st.st_size}:{st.st_mtime_ns}".encode()
+
+    try:
+        # Not closed explicitly: the returned columns may be zero-copy views of the mapping
+        reader = pa.ipc.open_file(pa.memory_map(feather_path))
+        if (reader.schema.metadata or {}).get(b'bulkrnaseq_source') == source_stamp:
+            return reader.read_pandas()
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable counts cache {feather_path}: {e}")
+
+    # featureCounts writes its command line as a leading '#' line, which pyarrow
+    # would take as the header; skip it explicitly. The header is read through pyarrow's
+    # stream so compressed (e.g. .tsv.gz) counts work just like pacsv.read_csv below.
+    with io.TextIOWrapper(pa.input_stream(counts_file, compression='detect'), encoding='utf-8') as f:
+        first = f.readline()
+        skip_rows = 1 if first.startswith('#') else 0
+        header = (f.readline() if skip_rows else first).rstrip('\n').split('\t')
+
+    # Read only the gene ID and sample count columns; featureCounts annotation
+    # columns are never used and would not be valid DESeq2 count data anyway
+    table = pacsv.read_csv(
+        counts_file,
+        read_options=pacsv.ReadOptions(skip_rows=skip_rows),
+        parse_options=pacsv.ParseOptions(delimiter='\t'),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[c for c in header if c not in FEATURECOUNTS_META_COLS]),
+    )
+    # Integer counts always fit in int32 in practice (2^31 reads per gene); storing them as
+    # int32 halves the matrix and matches R's 32-bit integer type, so DESeq2 gets integers
+    # rather than doubles. The checked cast keeps int64 if a count ever overflows.
+    int32_schema = pa.schema([f.with_type(pa.int32()) if f.type == pa.int64() else f
+                              for f in table.schema])
+    try:
+        table = table.cast(int32_schema)
+    except pa.ArrowInvalid:
+        pass
+    counts = table.to_pandas().set_index(header[0])
+
+    # Write the cache atomically so an interrupted run never leaves a truncated file behind
+    tmp_path = f"{feather_path}.{os.getpid()}.tmp"
+    try:
+        cache_table = pa.Table.from_pandas(counts)
+        cache_table = cache_table.replace_schema_metadata(
+            {**(cache_table.schema.metadata or {}), b'bulkrnaseq_source': source_stamp})
+        pa.feather.write_feather(cache_table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, feather_path)
+    except Exception as e:
+        logger.warning(f"Could not write counts cache {feather_path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return counts
+
+def _inputs_key(*paths):
+    """
+    Fingerprint input files by size and modification time (not content), so checking
+    whether a DESeq2 run is up to date costs a stat per file rather than a full read.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        st = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+def run_deseq2(counts_file, design_file, output_dir, threads=1):
     """
     Runs differential expression analysis using DESeq2 via rpy2.
     
@@ -37,15 +128,31 @@ def run_deseq2(counts_file, design_file, output_dir):
                    The first column should be gene identifiers.
       design_file: Path to a tab-delimited design file with at least two columns: sample and condition.
       output_dir: Directory to write DESeq2 results.
+      threads: Number of BiocParallel workers for fitting the per-gene models (1 = serial).
       
     DESeq2 performs its own normalization as part of the analysis.
     """
     prefix = os.path.basename(counts_file).split('.')[0]
     logger = setup_logger(prefix, output_dir)
     
+    # Skip the whole analysis if the results were produced from these exact inputs
+    output_file = os.path.join(output_dir, f"{prefix}_deseq2_results.txt")
+    key_file = output_file + ".key"
+    try:
+        key = _inputs_key(counts_file, design_file)
+    except OSError:
+        key = None  # missing inputs are reported by the loading step below
+    feather_file = os.path.join(output_dir, f"{prefix}_deseq2_results.feather")
+    if (key is not None and os.path.exists(output_file) and os.path.exists(feather_file)
+            and os.path.exists(key_file)):
+        with open(key_file) as f:
+            if f.read() == key:
+                logger.info("Inputs unchanged since the last run; reusing " + output_file)
+                return
+    
     logger.info("Loading counts and design files...")
     try:
-        counts = pd.read_csv(counts_file, sep='\t', index_col=0)
+        counts = load_counts(counts_file, output_dir)
         design = pd.read_csv(design_file, sep='\t')
     except Exception as e:
         logger.error("Error loading input files: " + str(e))
@@ -57,16 +164,35 @@ def run_deseq2(counts_file, design_file, output_dir):
         sys.exit(1)
     
     # Transfer data to R environment.
-    globalenv['counts'] = pandas2ri.py2rpy(counts)
+    # Counts go over as one integer matrix (a single buffer copy) rather than a data.frame
+    # that is converted column by column and then coerced back to a matrix by DESeq2.
+    # int64 only occurs when a count overflows R's 32-bit integers, so send those as doubles.
+    count_values = counts.to_numpy()
+    if count_values.dtype.kind in 'iu' and count_values.dtype.itemsize > 4:
+        count_values = count_values.astype('float64')
+    globalenv['counts'] = numpy2ri.py2rpy(count_values)
+    globalenv['gene_ids'] = StrVector(counts.index.astype(str).tolist())
+    globalenv['sample_ids'] = StrVector(counts.columns.astype(str).tolist())
+    r('dimnames(counts) <- list(gene_ids, sample_ids)')
     globalenv['coldata'] = pandas2ri.py2rpy(design)
     
     logger.info("Running DESeq2 differential expression analysis...")
     
     try:
+        # The per-gene GLM fits are independent, so spread them over BiocParallel workers.
+        # Forked workers are not available on Windows, so use socket workers there.
+        parallel = "FALSE"
+        if threads > 1:
+            param = "SnowParam" if sys.platform == "win32" else "MulticoreParam"
+            r('suppressPackageStartupMessages(library(BiocParallel))')
+            r(f'bpp <- {param}(workers = {int(threads)})')
+            parallel = "TRUE, BPPARAM = bpp"
+            logger.info(f"Using {threads} BiocParallel workers ({param})")
+
         # Create the DESeq2 dataset and perform the analysis.
         r('dds <- DESeqDataSetFromMatrix(countData = counts, colData = coldata, design = ~ condition)')
-        r('dds <- DESeq(dds)')
-        r('res <- results(dds)')
+        r(f'dds <- DESeq(dds, parallel = {parallel})')
+        r(f'res <- results(dds, parallel = {parallel})')
         r('resOrdered <- res[order(res$pvalue),]')
         r('resDF <- as.data.frame(resOrdered)')
     except Exception as e:
@@ -74,13 +200,42 @@ def run_deseq2(counts_file, design_file, output_dir):
         sys.exit(1)
     
     # Write out results to a tab-delimited text file.
-    output_file = os.path.join(output_dir, f"{prefix}_deseq2_results.txt")
     try:
         r(f'write.table(resDF, file="{output_file}", sep="\t", quote=FALSE, row.names=TRUE)')
     except Exception as e:
         logger.error("Error writing DESeq2 results: " + str(e))
         sys.exit(1)
+    # Also save a typed Feather copy so Python consumers can load the results without
+    # re-parsing the text table
+    feather_written = False
+    try:
+        with localconverter(robjects.default_converter + pandas2ri.converter):
+            res_df = robjects.conversion.rpy2py(r['resDF'])
+        res_df = res_df.rename_axis('gene_id').reset_index()
+        pa.feather.write_feather(pa.Table.from_pandas(res_df, preserve_index=False), feather_file)
+        feather_written = True
+    except Exception as e:
+        logger.warning("Could not write Feather copy of DESeq2 results: " + str(e))
+    
+    # Record which inputs these results came from so an unchanged rerun can be skipped.
+    # Only do so once every output was written by this run; otherwise the next run must redo it.
+    if key is not None and feather_written:
+        with open(key_file, "w") as f:
+            f.write(key)
     
     logger.info("DESeq2 analysis completed successfully.")
     logger.info("Results written to: " + output_file)
+    if feather_written:
+        logger.info("Feather copy written to: " + feather_file)
     print("DESeq2 analysis completed. Results:", output_file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run DESeq2 differential expression on a counts matrix")
+    parser.add_argument("--counts", required=True, help="Tab-delimited counts file (e.g. featureCounts output)")
+    parser.add_argument("--design", required=True, help="Tab-delimited design file with a 'condition' column")
+    parser.add_argument("--output_dir", required=True, help="Directory for DESeq2 results and logs")
+    parser.add_argument("--threads", type=int, default=1, help="Number of BiocParallel workers for DESeq2")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    run_deseq2(args.counts, args.design, args.output_dir, args.threads)
@@ -1,22 +1,119 @@
+import hashlib
+import logging
+import pickle
+import sqlite3
+from contextlib import closing
+from pathlib import Path
 import gseapy as gp
 import pandas as pd
 import mygene
+import requests
+
+# orjson parses large STRING payloads several times faster; fall back to the stdlib decoder
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache of Ensembl ID -> gene symbol (None when MyGene has no symbol)
+MYGENE_CACHE = Path.home() / ".cache" / "bulkrnaseq" / "mygene.sqlite"
+# On-disk cache of GO enrichment / STRING network results, keyed by query (see _result_key)
+RESULTS_CACHE = Path.home() / ".cache" / "bulkrnaseq" / "enrichment.sqlite"
+
+STRING_API_URL = "https://string-db.org/api/json/network"
+# Shared session so repeated STRING calls in one run reuse the TCP/TLS connection
+_session = requests.Session()
+
+def _strip_versions(gene_list):
+    """
+    Remove Ensembl version suffixes (e.g., "ENSG00000115414.21" -> "ENSG00000115414").
+    Uses pandas' vectorized string split rather than a per-gene Python loop.
+    """
+    return pd.Series(gene_list, dtype=object).str.split('.', n=1).str[0].tolist()
+
+def _result_key(kind, genes):
+    """
+    Stable cache key for an enrichment query. The gene list is de-duplicated and sorted,
+    since neither Enrichr nor STRING results depend on input order.
+    """
+    text = kind + "\n" + "\n".join(sorted(set(genes)))
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def _open_cache(path):
+    """
+    Open (creating if needed) a SQLite key/value cache. SQLite's file locking makes the
+    cache safe to share between concurrent pipeline processes.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB)")
+    return conn
+
+def _cache_get(path, keys):
+    """
+    Return {key: value} for the keys present in the cache at path.
+    The cache is best-effort: if it cannot be read (e.g. read-only HOME), an empty dict is returned.
+    """
+    found = {}
+    try:
+        with closing(_open_cache(path)) as conn:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((key, pickle.loads(value)) for key, value in rows)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache {path}: {e}")
+        return {}
+    return found
+
+def _cache_put(path, items):
+    """Store {key: value} items in the cache at path. Failures are logged and ignored."""
+    try:
+        with closing(_open_cache(path)) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)",
+                             [(key, pickle.dumps(value)) for key, value in items.items()])
+    except Exception as e:
+        logger.warning(f"Could not update cache {path}: {e}")
+
+def _cached_result(key):
+    """Return the cached result for key, or None if it is not cached (or the cache is unavailable)."""
+    return _cache_get(RESULTS_CACHE, [key]).get(key)
+
+def _store_result(key, result):
+    """Store a successful enrichment result under key; cache failures are logged, never raised."""
+    _cache_put(RESULTS_CACHE, {key: result})
 
 def convert_ensembl_to_symbols(gene_list):
     """
     Convert Ensembl IDs to gene symbols using mygene.
+    Version suffixes are stripped, duplicates are queried once, and results are cached
+    on disk so repeated runs only query IDs that have not been seen before.
     """
     try:
-        mg = mygene.MyGeneInfo()
-        # Query mygene for the gene info
-        gene_info = mg.querymany(gene_list, scopes='ensembl.gene', fields='symbol', species='human')
-        
+        # Clean gene IDs by removing version numbers and de-duplicate, keeping input order
+        ids = list(dict.fromkeys(_strip_versions(gene_list)))
+
+        symbols_by_id = _cache_get(MYGENE_CACHE, ids)
+        missing = [gene_id for gene_id in ids if gene_id not in symbols_by_id]
+        if missing:
+            # Query mygene once for all uncached IDs
+            mg = mygene.MyGeneInfo()
+            gene_info = mg.querymany(missing, scopes='ensembl.gene', fields='symbol', species='human')
+            found = {}
+            for info in gene_info:
+                if info.get('symbol'):
+                    found.setdefault(info['query'], info['symbol'])
+            fetched = {gene_id: found.get(gene_id) for gene_id in missing}
+            symbols_by_id.update(fetched)
+            _cache_put(MYGENE_CACHE, fetched)
+
         # Extract symbols, handling cases where the gene isn't found
-        symbols = []
-        for info in gene_info:
-            if 'symbol' in info:
-                symbols.append(info['symbol'])
-        
+        symbols = [symbols_by_id[gene_id] for gene_id in ids if symbols_by_id[gene_id]]
+
         return symbols
     except Exception as e:
         print(f"Error converting gene IDs: {str(e)}")
@@ -46,12 +143,20 @@ def perform_go_enrichment(gene_list):
             'GO_Cellular_Component_2021'
         ]
         
+        # The same gene set against the same libraries always gives the same result,
+        # so skip the Enrichr round-trip when it has been run before
+        key = _result_key("enrichr:" + ",".join(gene_sets), gene_symbols)
+        results = _cached_result(key)
+        if results is not None:
+            return results
+
         enrichr_results = gp.enrichr(
             gene_list=gene_symbols,
             gene_sets=gene_sets,
             cutoff=0.05  # Only show terms with adjusted p-value < 0.05
         )
         
+        _store_result(key, enrichr_results.results)
         return enrichr_results.results  # Return enrichment DataFrame
     except Exception as e:
         return f"Error in GO Enrichment Analysis: {str(e)}"
@@ -66,25 +171,28 @@ def perform_network_analysis(gene_list):
     Returns:
         dict or str: STRING API results or error message.
     """
-    import requests
-
-    # Limit the number of gene IDs to avoid overly long URLs
-    max_genes = 10
-    limited_gene_list = gene_list[:max_genes]
+    # Clean gene IDs by removing version numbers
+    cleaned_gene_list = _strip_versions(gene_list)
     
-    # Clean gene IDs by removing version numbers (e.g., "ENSG00000115414.21" -> "ENSG00000115414")
-    cleaned_gene_list = [gene.split('.')[0] for gene in limited_gene_list]
-    
-    string_api_url = "https://string-db.org/api/json/network"
-    params = {
-        "identifiers": "%0d".join(cleaned_gene_list),
+    # POST the identifiers (carriage-return separated, as STRING expects) so the list is not
+    # limited by URL length
+    data = {
+        "identifiers": "\r".join(cleaned_gene_list),
         "species": 9606,  # Human (adjust for other species)
         "limit": 10
     }
     
     try:
-        response = requests.get(string_api_url, params=params)
+        # Reuse the network from an earlier identical query
+        key = _result_key(f"string:{data['species']}:{data['limit']}", cleaned_gene_list)
+        network = _cached_result(key)
+        if network is not None:
+            return network
+
+        response = _session.post(STRING_API_URL, data=data)
         response.raise_for_status()  # Raise an exception for HTTP errors
-        return response.json()
+        network = json_loads(response.content)
+        _store_result(key, network)
+        return network
     except Exception as e:
         return f"Error in STRING Network Analysis: {str(e)}"
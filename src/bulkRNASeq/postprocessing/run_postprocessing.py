@@ -6,13 +6,14 @@
 # It will also save the logs in the logs/postprocessing directory
 # It will also save the reports in the reports/postprocessing directory
 
-import argparse, logging, os, sys, json
+import argparse, logging, os, sys
 #from bulkRNASeq.postprocessing.eda import run_eda
 from bulkRNASeq.postprocessing.kallisto import perform_pca, plot_clustering_heatmap, plot_abundance_distribution
 from bulkRNASeq.postprocessing.diffexp import run_deseq2
 from bulkRNASeq.postprocessing.enrichment import perform_go_enrichment, perform_network_analysis
 
 from bulkRNASeq.utils.check import check_config, check_postprocessing_directories
+from bulkRNASeq.utils.config import load_config
 
 def run_postprocessing(config):
     """
@@ -25,8 +26,7 @@ def run_postprocessing(config):
         Postprocessing pipeline reports in the reports/postprocessing directory
     """
     # Load the config file
-    with open(config, 'r') as f:
-        config = json.load(f)   
+    config = load_config(config)
 
     # Do the basic checks on config file
     check_config(config)
@@ -3,8 +3,13 @@ import subprocess
 import sys
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Every featureCounts process parses the whole GTF into its own memory, so by default give
+# each concurrent job at least this many threads rather than running one job per thread
+MIN_THREADS_PER_COUNT_JOB = 4
+
 def setup_logger(prefix, output_dir):
     """
     Sets up a logger that writes to a file with the given prefix in the output directory,
@@ -48,14 +53,14 @@ def get_completed_sample_ids(output_dir):
     if not output_path.exists():
         return completed_ids
     
-    # Look for files matching SRR*_counts.tsv pattern
-    for counts_file in output_path.glob("SRR*_counts.tsv"):
+    # Look for files matching the <sample>_counts.tsv pattern
+    for counts_file in output_path.glob("*_counts.tsv"):
         # Check if the file is complete (non-empty and has a summary file)
         if counts_file.stat().st_size > 0:
             summary_file = Path(str(counts_file) + ".summary")
             if summary_file.exists() and summary_file.stat().st_size > 0:
                 # Extract sample ID (remove _counts.tsv from filename)
-                sample_id = counts_file.stem.replace("_counts", "")
+                sample_id = counts_file.name[:-len("_counts.tsv")]
                 completed_ids.add(sample_id)
                 print(f"Found existing results for sample: {sample_id}")
     
@@ -76,7 +81,7 @@ def run_featurecounts(bam_file, output_dir, annotation_file, threads=8):
     Returns:
         bool: True if featureCounts ran successfully, False on error
     """
-    # Expect BAM filenames like: SRR16101435.bam
+    # Expect BAM filenames like: <sample>.bam, e.g. SRR16101435.bam
     prefix = os.path.basename(bam_file).replace(".bam", "")
     
     logger = setup_logger(prefix, output_dir)
@@ -132,17 +137,21 @@ def run_featurecounts(bam_file, output_dir, annotation_file, threads=8):
         print(error_msg, e.stderr, file=sys.stderr)
         return False
 
-def run_featurecounts_on_directory(input_dir, output_dir, annotation_file, threads=8, force_rerun=False):
+def run_featurecounts_on_directory(input_dir, output_dir, annotation_file, threads=8, force_rerun=False,
+                                   max_parallel=None):
     """
     Traverses the input directory for BAM files and runs featureCounts on each one.
     Skips files that have already been processed.
+    BAM files are counted concurrently, with the thread budget split between the parallel jobs.
     
     Args:
         input_dir (str): Directory containing input BAM files
         output_dir (str): Directory where output files will be stored
         annotation_file (str): Path to the genome annotation file (GTF/GFF)
-        threads (int): Number of threads to use
+        threads (int): Total number of threads to use across all parallel jobs
         force_rerun (bool): If True, rerun featureCounts even if output exists
+        max_parallel (int): Maximum number of featureCounts jobs at once
+                            (default: one per MIN_THREADS_PER_COUNT_JOB threads)
     """
     input_dir_path = Path(input_dir)
     
@@ -151,11 +160,11 @@ def run_featurecounts_on_directory(input_dir, output_dir, annotation_file, threa
     if not force_rerun:
         completed_sample_ids = get_completed_sample_ids(output_dir)
     
-    # Find all BAM files matching SRR pattern
-    all_bam_files = [f for f in input_dir_path.glob("SRR*.bam") if "tmp" not in f.name]
+    # Find all BAM files, whatever the sample naming scheme
+    all_bam_files = [f for f in input_dir_path.glob("*.bam") if "tmp" not in f.name]
     
     if not all_bam_files:
-        print(f"[ERROR] No SRR*.bam files found in {input_dir}", file=sys.stderr)
+        print(f"[ERROR] No *.bam files found in {input_dir}", file=sys.stderr)
         sys.exit(1)
     
     # Filter out BAM files that have already been processed
@@ -178,14 +187,20 @@ def run_featurecounts_on_directory(input_dir, output_dir, annotation_file, threa
     
     print(f"Found {len(bam_files_to_process)} BAM files to process out of {len(all_bam_files)} total.")
     
-    # Process the remaining BAM files
-    successes = 0
-    failures = 0
-    for bam_file in bam_files_to_process:
-        if run_featurecounts(str(bam_file), output_dir, annotation_file, threads):
-            successes += 1
-        else:
-            failures += 1
+    # Process the remaining BAM files. Each featureCounts run is its own subprocess, so threads are
+    # enough to keep them concurrent. Only the GTF's file bytes are shared (via the page cache);
+    # each process builds its own parsed annotation, so concurrency is capped conservatively.
+    n_parallel = min(len(bam_files_to_process),
+                     max_parallel or max(1, threads // MIN_THREADS_PER_COUNT_JOB), threads)
+    per_job_threads = max(1, threads // n_parallel)
+    print(f"Running {n_parallel} featureCounts job(s) in parallel with {per_job_threads} thread(s) each.")
+    with ThreadPoolExecutor(max_workers=n_parallel) as ex:
+        results = list(ex.map(
+            lambda bam_file: run_featurecounts(str(bam_file), output_dir, annotation_file, per_job_threads),
+            bam_files_to_process
+        ))
+    successes = sum(results)
+    failures = len(results) - successes
     
     print(f"featureCounts processing complete. Successfully processed {successes} files with {failures} failures.")
 
@@ -196,10 +211,12 @@ if __name__ == "__main__":
     parser.add_argument("--annotation_file", required=True, help="Path to the annotation GTF/GFF file")
     parser.add_argument("--threads", type=int, default=8, help="Number of threads to use")
     parser.add_argument("--force", action="store_true", help="Force rerun of featureCounts even if output exists")
+    parser.add_argument("--max_parallel", type=int, default=None, help="Maximum number of BAM files to count at once")
 
     args = parser.parse_args()
 
     # Create output directory if it doesn't exist
     os.makedirs(args.output_dir, exist_ok=True)
 
-    run_featurecounts_on_directory(args.input_dir, args.output_dir, args.annotation_file, args.threads, args.force)
+    run_featurecounts_on_directory(args.input_dir, args.output_dir, args.annotation_file, args.threads, args.force,
+                                   args.max_parallel)
@@ -2,8 +2,13 @@ import argparse
 import subprocess
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Each HISAT2 job loads its own copy of the index, so by default give every
+# concurrent job at least this many threads rather than one job per thread
+MIN_THREADS_PER_ALIGNMENT = 4
+
 def run_hisat2_alignment_pair(
     input_file_1: str,
     input_file_2: str,
@@ -36,12 +41,13 @@ def run_hisat2_alignment_pair(
         bam_file = output_dir / f"{sample_name}.bam"
         log_file = output_dir / f"{sample_name}_hisat2_alignment.log"
         
-        # Build the HISAT2 command for paired-end reads
+        # Build the HISAT2 command for paired-end reads; samtools sort writes the .bai
+        # index while it writes the BAM, so the BAM is not read back for indexing
         hisat2_cmd = (
             f"hisat2 -p {threads} -x {hisat2_index} "
             f"-1 {input_file_1} -2 {input_file_2} "
             f"--new-summary --dta 2> {log_file} | "
-            f"samtools sort -@ {threads} -o {bam_file}"
+            f"samtools sort -@ {threads} --write-index -o {bam_file}##idx##{bam_file}.bai"
         )
         
         if logger:
@@ -89,12 +95,6 @@ def run_hisat2_alignment_pair(
         if not bam_file.exists():
             raise RuntimeError(f"BAM file not created: {bam_file}")
         
-        # Index the BAM file
-        subprocess.run(
-            ['samtools', 'index', str(bam_file)],
-            check=True
-        )
-        
         if logger:
             logger.info(f"Alignment completed for sample {sample_name}")
             logger.info(f"Output BAM: {bam_file}")
@@ -149,12 +149,12 @@ def run_hisat2_alignment_single(
         bam_file = output_dir / f"{sample_name}.bam"
         log_file = output_dir / f"{sample_name}_hisat2_alignment.log"
         
-        # Build the HISAT2 command for single-end reads
+        # Build the HISAT2 command for single-end reads (BAM indexed during sort)
         hisat2_cmd = (
             f"hisat2 -p {threads} -x {hisat2_index} "
             f"-U {input_file} "
             f"--new-summary --dta 2> {log_file} | "
-            f"samtools sort -@ {threads} -o {bam_file}"
+            f"samtools sort -@ {threads} --write-index -o {bam_file}##idx##{bam_file}.bai"
         )
         
         if logger:
@@ -197,12 +197,6 @@ def run_hisat2_alignment_single(
         if not bam_file.exists():
             raise RuntimeError(f"BAM file not created: {bam_file}")
         
-        # Index the BAM file
-        subprocess.run(
-            ['samtools', 'index', str(bam_file)],
-            check=True
-        )
-        
         if logger:
             logger.info(f"Alignment completed for sample {sample_name}")
             logger.info(f"Output BAM: {bam_file}")
@@ -228,21 +222,27 @@ def traverse_and_align(
     hisat2_index: str,
     threads: int = 4,
     is_paired: bool = True,
-    logger: logging.Logger = None
+    logger: logging.Logger = None,
+    max_parallel: int = None
 ):
     """
     Traverse the input directory for FASTQ files and run HISAT2 alignment.
+    Samples are aligned concurrently, with the thread budget split between the parallel jobs.
     
     Args:
         input_dir: Directory containing FASTQ files
         output_dir: Directory for output files
         hisat2_index: Path prefix to HISAT2 index files
-        threads: Number of threads to use
+        threads: Total number of threads to use across all parallel jobs
         is_paired: Whether to use paired-end alignment (True) or single-end alignment (False)
         logger: Logger instance
+        max_parallel: Maximum number of samples to align at once
+                      (default: one per MIN_THREADS_PER_ALIGNMENT threads)
     """
     input_dir_path = Path(input_dir)
     
+    # Collect (sample name, alignment function, FASTQ inputs) for every sample first
+    jobs = []
     if is_paired:
         # Paired-end mode: find all files ending with '_1.fastq.gz' or '_1_trimmed.fastq.gz'
         fastq_files_1 = list(input_dir_path.glob("*_1*.fastq.gz"))
@@ -265,20 +265,7 @@ def traverse_and_align(
                 if logger:
                     logger.warning(f"Paired file for {file1} not found. Skipping sample {sample_name}.")
                 continue
-            try:
-                run_hisat2_alignment_pair(
-                    str(file1),
-                    str(file2),
-                    output_dir,
-                    hisat2_index,
-                    threads,
-                    logger
-                )
-            except Exception as e:
-                if logger:
-                    logger.error(f"Failed alignment for sample {sample_name}: {str(e)}")
-                else:
-                    print(f"Failed alignment for sample {sample_name}: {str(e)}", file=sys.stderr)
+            jobs.append((sample_name, run_hisat2_alignment_pair, (str(file1), str(file2))))
     else:
         # Single-end mode: find all fastq files
         fastq_files = list(input_dir_path.glob("*.fastq.gz"))
@@ -289,20 +276,30 @@ def traverse_and_align(
             raise FileNotFoundError(msg)
         
         for file in fastq_files:
-            try:
-                run_hisat2_alignment_single(
-                    str(file),
-                    output_dir,
-                    hisat2_index,
-                    threads,
-                    logger
-                )
-            except Exception as e:
-                sample_name = file.stem
-                if logger:
-                    logger.error(f"Failed alignment for sample {sample_name}: {str(e)}")
-                else:
-                    print(f"Failed alignment for sample {sample_name}: {str(e)}", file=sys.stderr)
+            jobs.append((file.stem, run_hisat2_alignment_single, (str(file),)))
+
+    if not jobs:
+        return
+
+    # Each alignment is its own hisat2 | samtools subprocess pipeline, so threads are enough
+    # to keep them concurrent without oversubscribing the cores
+    n_parallel = min(len(jobs), max_parallel or max(1, threads // MIN_THREADS_PER_ALIGNMENT))
+    per_job_threads = max(1, threads // n_parallel)
+    if logger:
+        logger.info(f"Aligning {len(jobs)} sample(s), {n_parallel} at a time with {per_job_threads} thread(s) each")
+
+    def align(job):
+        sample_name, align_fn, fastq_inputs = job
+        try:
+            align_fn(*fastq_inputs, output_dir, hisat2_index, per_job_threads, logger)
+        except Exception as e:
+            if logger:
+                logger.error(f"Failed alignment for sample {sample_name}: {str(e)}")
+            else:
+                print(f"Failed alignment for sample {sample_name}: {str(e)}", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=n_parallel) as ex:
+        list(ex.map(align, jobs))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="HISAT2 alignment for RNA-seq data")
@@ -312,6 +309,7 @@ if __name__ == "__main__":
     parser.add_argument("--threads", type=int, default=8, help="Number of threads to use")
     parser.add_argument("--paired", action="store_true", help="Use paired-end mode (default)")
     parser.add_argument("--single", action="store_true", help="Use single-end mode")
+    parser.add_argument("--max_parallel", type=int, default=None, help="Maximum number of samples to align at once")
     args = parser.parse_args()
     
     # Setup logger
@@ -330,5 +328,6 @@ if __name__ == "__main__":
         args.hisat2_index,
         args.threads,
         is_paired,
-        logger
+        logger,
+        args.max_parallel
     )
@@ -6,13 +6,14 @@
 # It will also save the logs in the logs/preprocessing directory
 # It will also save the reports in the reports/preprocessing directory
 
-import argparse, logging, os, sys, time, yaml, subprocess, pathlib
+import argparse, logging, os, sys, time, subprocess, pathlib
 from bulkRNASeq.utils.check import check_config, check_preprocessing_directories
+from bulkRNASeq.utils.config import load_config
 from bulkRNASeq.preprocessing.qc import run_fastqc
 from bulkRNASeq.preprocessing.trim import run_trim_pipeline
 from bulkRNASeq.preprocessing.kallisto import run_kallisto_quant
 from bulkRNASeq.preprocessing.hisat2 import traverse_and_align
-from bulkRNASeq.preprocessing.featurecounts import run_featurecounts
+from bulkRNASeq.preprocessing.featurecounts import run_featurecounts_on_directory
 # import create directories
 # import qc
 
@@ -27,8 +28,7 @@ def run_preprocessing(config):
             Preprocessing pipeline reports in the reports/preprocessing directory
     """
     # Load the config file
-    with open(config, 'r') as f:
-        config = yaml.safe_load(f)
+    config = load_config(config)
 
     # Do the basic checks on config file
     check_config(config)
@@ -53,7 +53,7 @@ def run_preprocessing(config):
     traverse_and_align(config['output']['trimmed_fastq_dir'], config['output']['aligned_dir'], config['input']['hisat2_index'])
 
     # Run featurecounts on the aligned files
-    run_featurecounts(config['output']['aligned_dir'], config['output']['counts_dir'], config['input']['annotation_file'])
+    run_featurecounts_on_directory(config['output']['aligned_dir'], config['output']['counts_dir'], config['input']['annotation_file'])
 
     # TODO: QC on kallisto allignment, check if feaa=ture counts is necessary, what is output of kallisto and is this it for kallisto allignment.
     # TODO: how to incorporate other allligners here.
@@ -2,7 +2,8 @@
 # like if config files exists or not and if the config file has all the necessary keys/information
 # if the directories exist or not
 
-import os, json, yaml
+import os, json
+from bulkRNASeq.utils.config import load_config
 
 def check_config(config):
     """
@@ -16,8 +17,7 @@ def check_config(config):
     if isinstance(config, str):
         if not os.path.exists(config):
             raise FileNotFoundError(f"The config file {config} does not exist")
-        with open(config, 'r') as f:
-            config = yaml.safe_load(f)
+        config = load_config(config)
     
     # check if the config has all the necessary keys/information
     if not all(key in config for key in ['input', 'output', 'genome', 'aligners', 'parameters', 'pipeline_steps']):
@@ -0,0 +1,38 @@
+# this code loads the pipeline config files
+# parsed configs are cached per process so repeated loads of the same file skip the YAML parser
+
+import copy, os, threading
+import yaml
+
+# Prefer the libyaml-backed loader; the pure-Python parser is many times slower
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# (path, st_mtime_ns, st_size, st_ino) -> parsed config
+_CFG_CACHE = {}
+_CFG_LOCK = threading.Lock()
+
+def load_config(path):
+    """
+    This function loads a YAML config file, reusing the parsed result while the file is unchanged
+    Args:
+        path: Path to the config file
+    Returns:
+        The config as a dict. Each call returns a fresh copy, so callers may modify it
+    """
+    s = os.stat(path)
+    # An edit changes mtime/size and an atomic replace changes the inode, so stale hits are not possible
+    key = (os.path.abspath(path), s.st_mtime_ns, s.st_size, s.st_ino)
+    with _CFG_LOCK:
+        config = _CFG_CACHE.get(key)
+    if config is None:
+        with open(path, 'r') as f:
+            config = yaml.load(f, Loader=SafeLoader)
+        with _CFG_LOCK:
+            # Drop entries for older versions of the same file
+            for old in [k for k in _CFG_CACHE if k[0] == key[0]]:
+                del _CFG_CACHE[old]
+            _CFG_CACHE[key] = config
+    return copy.deepcopy(config)
@@ -1,4 +1,3 @@
-import glob
 import os
 
 SAMPLE_DIR = "tests/data/raw_fastq"
@@ -6,11 +5,22 @@ SAMPLE_LIST_FILE = "config/samples.txt"
 
 def update_sample_list():
     """Update the list of sample names before Snakemake runs."""
-    fastq_files = glob.glob(os.path.join(SAMPLE_DIR, "*.fq.gz"))
-    sample_names = [os.path.basename(f).replace(".fq.gz", "") for f in fastq_files]
+    with os.scandir(SAMPLE_DIR) as it:
+        sample_names = [e.name[:-6] for e in it if e.name.endswith(".fq.gz") and e.is_file(follow_symlinks=False)]
 
-    with open(SAMPLE_LIST_FILE, "w") as f:
-        f.write("\n".join(sample_names))
+    # Sorted so directory order does not make an unchanged list look different
+    new = "\n".join(sorted(sample_names))
+    try:
+        with open(SAMPLE_LIST_FILE) as f:
+            old = f.read()
+    except FileNotFoundError:
+        old = None
+    # Leave the file (and its mtime) alone when nothing changed; otherwise replace it atomically
+    if new != old:
+        tmp_path = f"{SAMPLE_LIST_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(new)
+        os.replace(tmp_path, SAMPLE_LIST_FILE)
 
     print(f"Updated sample list: {sample_names}")
 
@@ -1,13 +1,18 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse
-import shutil
+import aiofiles
 import logging
+import os
+import tempfile
 from pathlib import Path
 import uvicorn
 import subprocess
 
-# Start monitor.py in the background
-subprocess.Popen(["python", "monitor.py"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+# Start monitor.py in the background. Its output goes to a log file rather than
+# an unread pipe, which would stall the monitor (and Snakemake) once full.
+Path("logs").mkdir(parents=True, exist_ok=True)
+with open("logs/monitor.log", "ab") as monitor_log:
+    subprocess.Popen(["python", "monitor.py"], stdout=monitor_log, stderr=subprocess.STDOUT)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,33 +22,81 @@ app = FastAPI()
 UPLOAD_DIR = "tests/data/raw_fastq"
 Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
+CHUNK_SIZE = 1024 * 1024  # Write uploads to disk in 1 MiB chunks
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     return """
     <html>
         <body>
             <h1>Upload a File</h1>
-            <form action="/upload/" method="post" enctype="multipart/form-data">
-                <input type="file" name="file">
-                <input type="submit" value="Upload">
-            </form>
+            <input type="file" id="file">
+            <button onclick="upload()">Upload</button>
+            <script>
+                async function upload() {
+                    const file = document.getElementById("file").files[0];
+                    const response = await fetch(
+                        "/upload/?filename=" + encodeURIComponent(file.name),
+                        {method: "POST", body: file}
+                    );
+                    alert(JSON.stringify(await response.json()));
+                }
+            </script>
         </body>
     </html>
     """
 
-@app.post("/upload/")
-async def upload_file(file: UploadFile = File(...)):
-    """Save uploaded file."""
-    file_location = f"{UPLOAD_DIR}/{file.filename}"
-    
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+@app.post("/upload/", status_code=202)
+async def upload_file(request: Request):
+    """Stream the raw request body straight to disk.
+
+    The filename is taken from the ``filename`` query parameter or the
+    ``X-Filename`` header, e.g.
+    ``curl --data-binary @sample.fq.gz "localhost:8000/upload/?filename=sample.fq.gz"``.
+    """
+    filename = request.query_params.get("filename") or request.headers.get("x-filename")
+    if not filename:
+        raise HTTPException(status_code=400, detail="Missing filename query parameter or X-Filename header.")
+
+    # Strip any directory components so uploads cannot escape UPLOAD_DIR
+    filename = Path(filename).name
+    if filename in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid filename.")
+    file_location = f"{UPLOAD_DIR}/{filename}"
+
+    # Stream to a hidden .part file the monitor ignores and rename it into place once the
+    # body is complete, so Snakemake never sees a half-written or abandoned upload. mkstemp
+    # gives each request its own .part file, so concurrent uploads of one name cannot interleave.
+    fd, part_location = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=f".{filename}.", suffix=".part")
+    os.close(fd)
+    try:
+        async with aiofiles.open(part_location, "wb") as f:
+            buffer = bytearray()
+            async for chunk in request.stream():
+                buffer.extend(chunk)
+                if len(buffer) >= CHUNK_SIZE:
+                    await f.write(bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await f.write(bytes(buffer))
+        os.replace(part_location, file_location)
+    except BaseException:
+        # Includes client disconnects and cancellation
+        Path(part_location).unlink(missing_ok=True)
+        raise
+
     logging.info(f"File saved at: {file_location}")
 
-    # DO NOT trigger Snakemake here! Let `monitor.py` handle it.
-    
-    return {"filename": file.filename, "message": "File uploaded successfully."}
+    # DO NOT trigger Snakemake here! `monitor.py` picks the file up and runs the
+    # workflow in its own process, so the request returns as soon as the write is done.
+    return {"filename": filename, "message": "File uploaded successfully. Processing queued."}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    # uvloop and httptools are C-backed replacements for asyncio's loop and h11.
+    # Stick to one worker: each worker process would start its own monitor.py.
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:  # e.g. Windows
+        loop = "asyncio"
+    uvicorn.run(app, host="127.0.0.1", port=8000, loop=loop, http="httptools")